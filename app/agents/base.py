@@ -1,13 +1,106 @@
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from .types import AgentResult, AgentStatus, AgentTask
 
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Get the worker pool shared by CPU-bound agents, creating it on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the worker processes of CPU-bound agents, if they were started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
 
 class Agent:
-    def __init__(self, name: str, description: str | None = None):
+    # CPU-bound agents run execute_task in a worker process to keep the event
+    # loop responsive; the agent and task must then be picklable
+    cpu_bound: bool = False
+
+    def __init__(
+        self, name: str, description: str | None = None, max_tasks: int = 1000
+    ):
         self.name = name
         self.description = description
-        self.tasks: dict[str, AgentTask] = {}
+        # Only the most recent max_tasks tasks are kept; older ones are evicted
+        self.max_tasks = max_tasks
+        self.tasks: OrderedDict[str, AgentTask] = OrderedDict()
         self.results: dict[str, AgentResult] = {}
         self.status: dict[str, AgentStatus] = {}
+        # Set once a running task's final result is recorded, for wait_for_task
+        self._finished: dict[str, asyncio.Event] = {}
+        # Set whenever a task's result changes, for wait_for_update
+        self._updated: dict[str, asyncio.Event] = {}
+        # Strong references to submitted tasks so they are not garbage collected
+        self._background: set[asyncio.Task] = set()
+
+    def __getstate__(self):
+        # Task bookkeeping stays in the parent process; workers only need config
+        state = self.__dict__.copy()
+        state.update(
+            tasks=OrderedDict(),
+            results={},
+            status={},
+            _finished={},
+            _updated={},
+            _background=set(),
+        )
+        return state
+
+    def _track_task(self, task: AgentTask) -> None:
+        """Record a new running task, evicting the oldest ones beyond max_tasks"""
+        self.tasks[task.id] = task
+        # A placeholder result lets get_result answer with a single lookup
+        self.results[task.id] = AgentResult(task_id=task.id, status=AgentStatus.RUNNING)
+        self.status[task.id] = AgentStatus.RUNNING
+        self._finished[task.id] = asyncio.Event()
+        while len(self.tasks) > self.max_tasks:
+            task_id, _ = self.tasks.popitem(last=False)
+            self.results.pop(task_id, None)
+            self.status.pop(task_id, None)
+            # Wake any waiters; they will find the task gone
+            finished = self._finished.pop(task_id, None)
+            if finished is not None:
+                finished.set()
+            self._notify_update(task_id)
+
+    def _record_result(
+        self, task_id: str, result: AgentResult, status: AgentStatus
+    ) -> None:
+        """Store a task's final result unless the task was already evicted"""
+        if task_id in self.tasks:
+            self.results[task_id] = result
+            self.status[task_id] = status
+            finished = self._finished.pop(task_id, None)
+            if finished is not None:
+                finished.set()
+            self._notify_update(task_id)
+
+    def _record_progress(self, task_id: str, partial: dict) -> None:
+        """Publish the partial result of a task that is still running"""
+        if task_id in self.tasks:
+            self.results[task_id] = AgentResult(
+                task_id=task_id, status=AgentStatus.RUNNING, result=partial
+            )
+            self._notify_update(task_id)
+
+    def _notify_update(self, task_id: str) -> None:
+        """Wake everything waiting for the task's result to change"""
+        updated = self._updated.pop(task_id, None)
+        if updated is not None:
+            updated.set()
 
     async def execute_task(self, task: AgentTask) -> AgentResult:
         """
@@ -15,31 +108,74 @@ class Agent:
         """
         raise NotImplementedError("Agents must implement execute_task method")
 
+    def _sync_execute(self, task: AgentTask) -> AgentResult:
+        """Run execute_task to completion inside a worker process"""
+        return asyncio.run(self.execute_task(task))
+
     async def run_task(self, task: AgentTask) -> str:
         """Run a task and return its ID"""
-        self.tasks[task.id] = task
-        self.status[task.id] = AgentStatus.RUNNING
+        self._track_task(task)
+        await self._run_tracked_task(task)
+        return task.id
+
+    def submit_task(self, task: AgentTask) -> str:
+        """Start a task on the event loop without waiting for it and return its ID"""
+        # Tracked up front so its result can be polled straight away
+        self._track_task(task)
+        background = asyncio.create_task(self._run_tracked_task(task))
+        self._background.add(background)
+        background.add_done_callback(self._background.discard)
+        return task.id
 
+    async def _run_tracked_task(self, task: AgentTask) -> None:
+        """Execute an already tracked task and record its outcome"""
         try:
-            result = await self.execute_task(task)
-            self.results[task.id] = result
-            self.status[task.id] = AgentStatus.COMPLETED
+            if self.cpu_bound:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    _get_process_pool(), self._sync_execute, task
+                )
+            else:
+                result = await self.execute_task(task)
+            self._record_result(task.id, result, AgentStatus.COMPLETED)
         except Exception as e:
-            self.results[task.id] = AgentResult(
-                task_id=task.id, status=AgentStatus.FAILED, error=str(e)
+            self._record_result(
+                task.id,
+                AgentResult(task_id=task.id, status=AgentStatus.FAILED, error=str(e)),
+                AgentStatus.FAILED,
             )
-            self.status[task.id] = AgentStatus.FAILED
-
-        return task.id
 
     def get_result(self, task_id: str) -> AgentResult:
         """Get the result for a specific task"""
-        if task_id not in self.tasks:
+        result = self.results.get(task_id)
+        if result is None:
             raise ValueError(f"Task {task_id} not found")
+        return result
 
-        if task_id in self.results:
-            return self.results[task_id]
+    async def wait_for_task(
+        self, task_id: str, timeout: float | None = None
+    ) -> AgentResult:
+        """Wait until a task finishes or the timeout passes, then get its result"""
+        result = self.get_result(task_id)
+        finished = self._finished.get(task_id)
+        if finished is not None:
+            try:
+                await asyncio.wait_for(finished.wait(), timeout)
+            except TimeoutError:
+                pass
+            result = self.get_result(task_id)
+        return result
 
-        return AgentResult(
-            task_id=task_id, status=self.status.get(task_id, AgentStatus.IDLE)
-        )
+    async def wait_for_update(
+        self, task_id: str, timeout: float | None = None
+    ) -> AgentResult:
+        """Wait until a running task's result changes or the timeout passes, then get it"""
+        result = self.get_result(task_id)
+        if result.status == AgentStatus.RUNNING:
+            updated = self._updated.setdefault(task_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(updated.wait(), timeout)
+            except TimeoutError:
+                pass
+            result = self.get_result(task_id)
+        return result
@@ -1,13 +1,62 @@
 import asyncio
+import math
+import operator
+from functools import reduce
+from typing import Callable
 
 from app.agents.base import Agent
 from app.agents.types import AgentResult, AgentStatus, AgentTask
 
 
+# Reductions run in C via builtins rather than as Python-level loops; invalid
+# operands are reported by raising ValueError with a user-facing message
+def _add(operands: list[float]) -> float:
+    return sum(operands)
+
+
+def _subtract(operands: list[float]) -> float:
+    if len(operands) < 2:
+        raise ValueError("Subtraction requires at least 2 operands")
+    return operands[0] - sum(operands[1:])
+
+
+def _multiply(operands: list[float]) -> float:
+    return math.prod(operands)
+
+
+def _divide(operands: list[float]) -> float:
+    if len(operands) < 2:
+        raise ValueError("Division requires at least 2 operands")
+    # A zero divisor is caught during the single division pass
+    try:
+        return reduce(operator.truediv, operands)
+    except ZeroDivisionError:
+        raise ValueError("Division by zero is not allowed") from None
+
+
+_OPERATIONS: dict[str, Callable[[list[float]], float]] = {
+    "add": _add,
+    "subtract": _subtract,
+    "multiply": _multiply,
+    "divide": _divide,
+}
+
+
 class CalculatorAgent(Agent):
+    def __init__(
+        self,
+        name: str,
+        description: str | None = None,
+        simulate_latency: bool = False,
+        max_tasks: int = 1000,
+    ):
+        super().__init__(name, description, max_tasks)
+        self._simulate_latency = simulate_latency
+
     async def execute_task(self, task: AgentTask) -> AgentResult:
-        # Simulate some async work
-        await asyncio.sleep(0.5)
+        if self._simulate_latency:
+            # Simulate some async work
+            await asyncio.sleep(0.5)
 
         if task.name == "calculate":
             try:
@@ -24,44 +73,23 @@ class CalculatorAgent(Agent):
                     )
 
                 # Perform calculation based on operation
-                result = None
-                if operation == "add":
-                    result = sum(operands)
-                elif operation == "subtract":
-                    if len(operands) < 2:
-                        return AgentResult(
-                            task_id=task.id,
-                            status=AgentStatus.FAILED,
-                            error="Subtraction requires at least 2 operands",
-                        )
-                    result = operands[0] - sum(operands[1:])
-                elif operation == "multiply":
-                    result = 1
-                    for operand in operands:
-                        result *= operand
-                elif operation == "divide":
-                    if len(operands) < 2:
-                        return AgentResult(
-                            task_id=task.id,
-                            status=AgentStatus.FAILED,
-                            error="Division requires at least 2 operands",
-                        )
-                    if 0 in operands[1:]:
-                        return AgentResult(
-                            task_id=task.id,
-                            status=AgentStatus.FAILED,
-                            error="Division by zero is not allowed",
-                        )
-                    result = operands[0]
-                    for operand in operands[1:]:
-                        result /= operand
-                else:
+                handler = _OPERATIONS.get(operation)
+                if handler is None:
                     return AgentResult(
                         task_id=task.id,
                         status=AgentStatus.FAILED,
                         error=f"Unknown operation: {operation}",
                     )
 
+                try:
+                    result = handler(operands)
+                except ValueError as e:
+                    return AgentResult(
+                        task_id=task.id,
+                        status=AgentStatus.FAILED,
+                        error=str(e),
+                    )
+
                 return AgentResult(
                     task_id=task.id,
                     status=AgentStatus.COMPLETED,
@@ -1,18 +1,41 @@
 import asyncio
 
+import numpy as np
+
 from app.agents.base import Agent
 from app.agents.types import AgentResult, AgentStatus, AgentTask
 
 
 class DataProcessingAgent(Agent):
+    cpu_bound = True
+
+    def __init__(
+        self,
+        name: str,
+        description: str | None = None,
+        simulate_latency: bool = False,
+        max_tasks: int = 1000,
+    ):
+        super().__init__(name, description, max_tasks)
+        self._simulate_latency = simulate_latency
+
     async def execute_task(self, task: AgentTask) -> AgentResult:
-        # Simulate some async work
-        await asyncio.sleep(2)
+        if self._simulate_latency:
+            # Simulate some async work
+            await asyncio.sleep(2)
 
         if task.name == "process_data":
             # Example processing logic
-            data = task.parameters.get("data", [])
-            processed = [item * 2 for item in data if isinstance(item, (int, float))]
+            if "data_array" in task.parameters:
+                # Numeric data, ideally already an ndarray, doubled by NumPy with
+                # its own dtypes rather than Python's arbitrary precision ints
+                data_array = np.asarray(task.parameters["data_array"])
+                processed = (data_array * 2).tolist()
+            else:
+                data = task.parameters.get("data", [])
+                processed = [
+                    item * 2 for item in data if isinstance(item, (int, float))
+                ]
 
             return AgentResult(
                 task_id=task.id,
@@ -1,21 +1,66 @@
 """Executor agent that uses Llama via Ollama to execute plans."""
 
-from typing import Any, Dict
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
 from app.agents.base import Agent
 from app.agents.types import AgentResult, AgentStatus, AgentTask
-from app.clients.ollama_client import OllamaClient
+from app.clients.ollama_client import get_ollama_client
+from app.utils.cache import LRUCache, make_cache_key, normalize_prompt
+
+# Expected output format and system prompt, shared by every call
+_EXECUTION_OUTPUT_FORMAT = {
+    "status": "string",  # "completed" or "failed"
+    "error": "string",  # Error message if status is "failed"
+    "output": "string",  # The result of the step execution
+    "notes": "string",  # Additional notes or observations
+}
+
+_EXECUTION_SYSTEM_PROMPT = (
+    "You are an execution assistant that carries out steps in a plan. "
+    "For each step, you should determine how to accomplish it and provide a detailed output. "
+    "If you cannot complete a step, explain why and provide an error message."
+)
+
+_EXECUTION_INSTRUCTIONS = (
+    "Execute this step and provide a detailed output. "
+    "If you cannot complete the step, explain why and provide an error message. "
+    "Your response should include the status (completed or failed), "
+    "the output of the execution, any error messages if applicable, "
+    "and additional notes or observations."
+)
+
+
+@dataclass(slots=True)
+class StepResult:
+    """Outcome of one step of an executed plan."""
+
+    step_id: str
+    title: str
+    status: str
+    output: str
+    error: str | None
+
+
+def _failure_reported(fields: Dict[str, Any]) -> bool:
+    """Whether a streamed execution result already reports a failure and its cause."""
+    return fields.get("status") == "failed" and "error" in fields
 
 
 class ExecutorAgent(Agent):
     """Agent that executes plans using Llama via Ollama."""
 
+    _PLAN_REQUIRED_FIELDS = frozenset({"plan_id", "title", "steps"})
+    _STEP_REQUIRED_FIELDS = frozenset({"step_id", "title", "description"})
+
     def __init__(
         self,
         name: str,
         description: str | None = None,
         ollama_url: str = "http://localhost:11434",
         model: str = "gemma3",
+        max_tasks: int = 1000,
     ):
         """
         Initialize the executor agent.
@@ -25,9 +70,11 @@ class ExecutorAgent(Agent):
             description: Description of the agent
             ollama_url: URL of the Ollama API
             model: Model to use for generation
+            max_tasks: Maximum number of tasks to keep results for
         """
-        super().__init__(name, description)
-        self.ollama_client = OllamaClient(base_url=ollama_url, model=model)
+        super().__init__(name, description, max_tasks)
+        self.ollama_client = get_ollama_client(base_url=ollama_url, model=model)
+        self.response_cache = LRUCache(maxsize=256)
 
     async def execute_task(self, task: AgentTask) -> AgentResult:
         """
@@ -80,24 +127,72 @@ class ExecutorAgent(Agent):
                     error="Invalid plan structure",
                 )
 
-            # Execute each step in the plan
+            # Group steps into layers whose dependencies are already satisfied
             steps = plan.get("steps", [])
-            results = []
-
-            for step in steps:
-                step_result = await self._execute_step_internal(step, context)
-                results.append(
-                    {
-                        "step_id": step.get("step_id"),
-                        "title": step.get("title"),
-                        "status": step_result.get("status"),
-                        "output": step_result.get("output"),
-                        "error": step_result.get("error"),
-                    }
+            layers = self._dependency_layers(steps)
+            if layers is None:
+                return AgentResult(
+                    task_id=task.id,
+                    status=AgentStatus.FAILED,
+                    error="Invalid plan structure: circular step dependencies",
                 )
 
+            # Results are kept in plan order, whatever order the layers run in
+            results: List[Optional[StepResult]] = [None] * len(steps)
+            steps_completed = 0
+
+            for layer in layers:
+                # Steps in the same layer are independent, so run them concurrently
+                pending = {
+                    asyncio.create_task(
+                        self._execute_step_internal(steps[i], context)
+                    ): i
+                    for i in layer
+                }
+                failed_step = None
+                try:
+                    while pending and failed_step is None:
+                        done, _ = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for step_task in sorted(done, key=pending.get):
+                            i = pending.pop(step_task)
+                            step = steps[i]
+                            step_result = step_task.result()
+                            results[i] = StepResult(
+                                step_id=step.get("step_id"),
+                                title=step.get("title"),
+                                status=step_result.get("status"),
+                                output=step_result.get("output"),
+                                error=step_result.get("error"),
+                            )
+                            steps_completed += 1
+                            if (
+                                failed_step is None
+                                and step_result.get("status") == "failed"
+                            ):
+                                failed_step = (step, step_result)
+
+                        # Let followers of the task see the steps done so far
+                        self._record_progress(
+                            task.id,
+                            {
+                                "plan_id": plan.get("plan_id"),
+                                "title": plan.get("title"),
+                                "steps_completed": steps_completed,
+                                "total_steps": len(steps),
+                                "step_results": [r for r in results if r is not None],
+                            },
+                        )
+                finally:
+                    # Fail fast: a failed step cancels the rest of its layer
+                    for step_task in pending:
+                        step_task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+
                 # If a step fails, mark the plan as failed
-                if step_result.get("status") == "failed":
+                if failed_step is not None:
+                    step, step_result = failed_step
                     return AgentResult(
                         task_id=task.id,
                         status=AgentStatus.FAILED,
@@ -105,9 +200,10 @@ class ExecutorAgent(Agent):
                         result={
                             "plan_id": plan.get("plan_id"),
                             "title": plan.get("title"),
-                            "steps_completed": len(results),
+                            "steps_completed": steps_completed,
                             "total_steps": len(steps),
-                            "step_results": results,
+                            # Cancelled steps and later layers are left out
+                            "step_results": [r for r in results if r is not None],
                         },
                     )
 
@@ -118,7 +214,7 @@ class ExecutorAgent(Agent):
                 result={
                     "plan_id": plan.get("plan_id"),
                     "title": plan.get("title"),
-                    "steps_completed": len(results),
+                    "steps_completed": steps_completed,
                     "total_steps": len(steps),
                     "step_results": results,
                 },
@@ -210,26 +306,26 @@ class ExecutorAgent(Agent):
             # Construct the prompt
             prompt = self._construct_execution_prompt(step, context)
 
-            # Define the expected output format
-            output_format = {
-                "status": "string",  # "completed" or "failed"
-                "output": "string",  # The result of the step execution
-                "error": "string",  # Error message if status is "failed"
-                "notes": "string",  # Additional notes or observations
-            }
+            temperature = 0.3  # Lower temperature for more deterministic results
 
-            # Generate the execution result
-            system_prompt = (
-                "You are an execution assistant that carries out steps in a plan. "
-                "For each step, you should determine how to accomplish it and provide a detailed output. "
-                "If you cannot complete a step, explain why and provide an error message."
+            # Reuse the result of an identical step that already completed
+            cache_key = make_cache_key(
+                model=self.ollama_client.model,
+                prompt=normalize_prompt(prompt),
+                system_prompt=_EXECUTION_SYSTEM_PROMPT,
+                output_format=_EXECUTION_OUTPUT_FORMAT,
+                temperature=temperature,
             )
+            cached_result = self.response_cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
 
             execution_result = await self.ollama_client.generate_structured(
                 prompt=prompt,
-                system_prompt=system_prompt,
-                output_format=output_format,
-                temperature=0.3,  # Lower temperature for more deterministic results
+                system_prompt=_EXECUTION_SYSTEM_PROMPT,
+                output_format=_EXECUTION_OUTPUT_FORMAT,
+                temperature=temperature,
+                stop_when=_failure_reported,
             )
 
             # Check if there was an error in generating the structured response
@@ -241,6 +337,13 @@ class ExecutorAgent(Agent):
                     "notes": execution_result.get("raw_response", ""),
                 }
 
+            # Failed steps are not cached so that they can be retried
+            if execution_result.get("status") == "failed":
+                # Generation stops once the failure is reported, usually
+                # before the output and notes fields have been streamed
+                return {"output": "", "notes": "", **execution_result}
+
+            self.response_cache.set(cache_key, execution_result)
             return execution_result
 
         except Exception as e:
@@ -262,24 +365,66 @@ class ExecutorAgent(Agent):
         Returns:
             The constructed prompt
         """
-        prompt = "Execute the following step:\n\n"
-        prompt += f"Step ID: {step.get('step_id')}\n"
-        prompt += f"Title: {step.get('title')}\n"
-        prompt += f"Description: {step.get('description')}\n"
-        prompt += f"Expected Outcome: {step.get('expected_outcome')}\n\n"
+        parts = [
+            "Execute the following step:\n\n",
+            f"Step ID: {step.get('step_id')}\n",
+            f"Title: {step.get('title')}\n",
+            f"Description: {step.get('description')}\n",
+            f"Expected Outcome: {step.get('expected_outcome')}\n\n",
+        ]
 
         if context:
-            prompt += f"Context:\n{context}\n\n"
+            parts.append(f"Context:\n{context}\n\n")
 
-        prompt += (
-            "Execute this step and provide a detailed output. "
-            "If you cannot complete the step, explain why and provide an error message. "
-            "Your response should include the status (completed or failed), "
-            "the output of the execution, any error messages if applicable, "
-            "and additional notes or observations."
-        )
+        parts.append(_EXECUTION_INSTRUCTIONS)
 
-        return prompt
+        return "".join(parts)
+
+    def _dependency_layers(
+        self, steps: List[Dict[str, Any]]
+    ) -> Optional[List[List[int]]]:
+        """
+        Group steps into layers that can be executed concurrently.
+
+        A step may list the IDs of the steps it needs in ``depends_on``. Steps
+        that do not declare it, or whose IDs all match no other step, depend on
+        the previous step, so plans without usable dependency information still
+        run sequentially.
+
+        Args:
+            steps: The steps of the plan, in plan order
+
+        Returns:
+            The indices of the steps grouped into layers, or None if the
+            dependencies are circular
+        """
+        index = {step["step_id"]: i for i, step in enumerate(steps)}
+        dependencies = []
+        for i, step in enumerate(steps):
+            declared = step.get("depends_on")
+            if declared is None:
+                dependencies.append({i - 1} if i else set())
+                continue
+            if isinstance(declared, str):
+                declared = [declared]
+            resolved = {index[d] for d in declared if d in index} - {i}
+            if declared and not resolved:
+                # Placeholder or invented IDs say nothing about the order
+                resolved = {i - 1} if i else set()
+            dependencies.append(resolved)
+
+        layers = []
+        done: set[int] = set()
+        remaining = list(range(len(steps)))
+        while remaining:
+            layer = [i for i in remaining if dependencies[i] <= done]
+            if not layer:
+                return None
+            layers.append(layer)
+            done.update(layer)
+            remaining = [i for i in remaining if i not in done]
+
+        return layers
 
     def _validate_plan(self, plan: Dict[str, Any]) -> bool:
         """
@@ -291,20 +436,14 @@ class ExecutorAgent(Agent):
         Returns:
             True if the plan is valid, False otherwise
         """
-        required_fields = ["plan_id", "title", "steps"]
-
-        for field in required_fields:
-            if field not in plan:
-                return False
-
-        if not isinstance(plan.get("steps"), list):
+        if not self._PLAN_REQUIRED_FIELDS.issubset(plan):
             return False
 
-        for step in plan.get("steps", []):
-            if not self._validate_step(step):
-                return False
+        steps = plan.get("steps")
+        if not isinstance(steps, list):
+            return False
 
-        return True
+        return all(self._validate_step(step) for step in steps)
 
     def _validate_step(self, step: Dict[str, Any]) -> bool:
         """
@@ -316,10 +455,4 @@ class ExecutorAgent(Agent):
         Returns:
             True if the step is valid, False otherwise
         """
-        required_fields = ["step_id", "title", "description"]
-
-        for field in required_fields:
-            if field not in step:
-                return False
-
-        return True
+        return self._STEP_REQUIRED_FIELDS.issubset(step)
@@ -1,10 +1,48 @@
 """Planner agent that uses Llama via Ollama to create structured plans."""
 
-from typing import List
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
 
 from app.agents.base import Agent
 from app.agents.types import AgentResult, AgentStatus, AgentTask
-from app.clients.ollama_client import OllamaClient
+from app.clients.ollama_client import get_ollama_client, parse_structured_response
+from app.utils.cache import LRUCache, make_cache_key, normalize_prompt
+
+# Expected output format and system prompt, shared by every call
+_PLAN_OUTPUT_FORMAT = {
+    "plan_id": "string",
+    "title": "string",
+    "description": "string",
+    "steps": [
+        {
+            "step_id": "string",
+            "title": "string",
+            "description": "string",
+            "expected_outcome": "string",
+            "depends_on": ["string"],
+        }
+    ],
+    "estimated_completion_time": "string",
+    "dependencies": ["string"],
+    "resources_needed": ["string"],
+}
+
+_PLANNING_SYSTEM_PROMPT = (
+    "You are a planning assistant that creates detailed, structured plans. "
+    "Your plans should be comprehensive, logical, and actionable. "
+    "Break down complex tasks into clear steps with specific outcomes."
+)
+
+_PLANNING_TEMPERATURE = 0.7
+
+_PLANNING_INSTRUCTIONS = (
+    "Create a comprehensive plan with clear, actionable steps. "
+    "Each step should have a specific outcome and be logically ordered. "
+    "List the step_ids each step depends on in depends_on, leaving it empty "
+    "for steps that can start right away, and include the resources needed."
+)
 
 
 class PlannerAgent(Agent):
@@ -16,6 +54,7 @@ class PlannerAgent(Agent):
         description: str | None = None,
         ollama_url: str = "http://localhost:11434",
         model: str = "gemma3",
+        max_tasks: int = 1000,
     ):
         """
         Initialize the planner agent.
@@ -25,9 +64,11 @@ class PlannerAgent(Agent):
             description: Description of the agent
             ollama_url: URL of the Ollama API
             model: Model to use for generation
+            max_tasks: Maximum number of tasks to keep results for
         """
-        super().__init__(name, description)
-        self.ollama_client = OllamaClient(base_url=ollama_url, model=model)
+        super().__init__(name, description, max_tasks)
+        self.ollama_client = get_ollama_client(base_url=ollama_url, model=model)
+        self.response_cache = LRUCache(maxsize=256)
 
     async def execute_task(self, task: AgentTask) -> AgentResult:
         """
@@ -59,76 +100,193 @@ class PlannerAgent(Agent):
             The planning result
         """
         try:
-            # Extract parameters
-            task_description = task.parameters.get("description", "")
-            context = task.parameters.get("context", "")
-            constraints = task.parameters.get("constraints", [])
-
-            if not task_description:
+            # Construct the prompt
+            prompt = self._planning_prompt(task)
+            if prompt is None:
                 return AgentResult(
                     task_id=task.id,
                     status=AgentStatus.FAILED,
                     error="Missing task description",
                 )
 
-            # Construct the prompt
-            prompt = self._construct_planning_prompt(
-                task_description, context, constraints
+            # Reuse a plan already generated for an identical request
+            cache_key = self._plan_cache_key(prompt)
+            plan = self.response_cache.get(cache_key)
+
+            if plan is None:
+                plan = await self.ollama_client.generate_structured(
+                    prompt=prompt,
+                    system_prompt=_PLANNING_SYSTEM_PROMPT,
+                    output_format=_PLAN_OUTPUT_FORMAT,
+                    temperature=_PLANNING_TEMPERATURE,
+                )
+
+            return self._plan_result(task, plan, cache_key)
+
+        except Exception as e:
+            return AgentResult(
+                task_id=task.id,
+                status=AgentStatus.FAILED,
+                error=f"Planning error: {str(e)}",
             )
 
-            # Define the expected output format
-            output_format = {
-                "plan_id": "string",
-                "title": "string",
-                "description": "string",
-                "steps": [
-                    {
-                        "step_id": "string",
-                        "title": "string",
-                        "description": "string",
-                        "expected_outcome": "string",
-                    }
-                ],
-                "estimated_completion_time": "string",
-                "dependencies": ["string"],
-                "resources_needed": ["string"],
-            }
-
-            # Generate the plan
-            system_prompt = (
-                "You are a planning assistant that creates detailed, structured plans. "
-                "Your plans should be comprehensive, logical, and actionable. "
-                "Break down complex tasks into clear steps with specific outcomes."
+    def stream_task(self, task: AgentTask) -> AsyncIterator[str]:
+        """
+        Run a planning task while streaming the model's output as it is generated.
+
+        The task is tracked as soon as this is called, like one started with
+        submit_task, and the parsed plan is recorded as its result once the
+        stream ends.
+
+        Args:
+            task: The planning task
+
+        Returns:
+            An iterator over chunks of the generated plan text
+        """
+        # Tracked up front so its result can be polled before the stream starts
+        self._track_task(task)
+        return self._stream_tracked_task(task)
+
+    async def _stream_tracked_task(self, task: AgentTask) -> AsyncIterator[str]:
+        """
+        Stream an already tracked planning task and record its outcome.
+
+        Args:
+            task: The planning task
+
+        Yields:
+            Chunks of the generated plan text
+        """
+        if task.name != "create_plan":
+            result = AgentResult(
+                task_id=task.id,
+                status=AgentStatus.FAILED,
+                error=f"Unknown task type: {task.name}",
             )
+            self._record_result(task.id, result, result.status)
+            return
 
-            plan = await self.ollama_client.generate_structured(
-                prompt=prompt,
-                system_prompt=system_prompt,
-                output_format=output_format,
-                temperature=0.7,
+        prompt = self._planning_prompt(task)
+        if prompt is None:
+            result = AgentResult(
+                task_id=task.id,
+                status=AgentStatus.FAILED,
+                error="Missing task description",
             )
+            self._record_result(task.id, result, result.status)
+            return
 
-            # Check if there was an error in generating the structured response
-            if "error" in plan:
-                return AgentResult(
-                    task_id=task.id,
-                    status=AgentStatus.FAILED,
-                    error=f"Failed to generate structured plan: {plan.get('error')}",
-                    result={"raw_response": plan.get("raw_response", "")},
-                )
+        # A cached plan is sent whole
+        cache_key = self._plan_cache_key(prompt)
+        plan = self.response_cache.get(cache_key)
+        if plan is not None:
+            result = self._plan_result(task, plan, cache_key)
+            self._record_result(task.id, result, result.status)
+            yield orjson.dumps(plan).decode()
+            return
 
-            return AgentResult(
+        chunks = []
+        try:
+            async for chunk in self.ollama_client.generate_structured_stream(
+                prompt=prompt,
+                system_prompt=_PLANNING_SYSTEM_PROMPT,
+                output_format=_PLAN_OUTPUT_FORMAT,
+                temperature=_PLANNING_TEMPERATURE,
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer went away before the plan was complete, either by
+            # closing the stream or by cancelling the request that read it
+            result = AgentResult(
                 task_id=task.id,
-                status=AgentStatus.COMPLETED,
-                result={"plan": plan},
+                status=AgentStatus.FAILED,
+                error="Planning stream closed before the plan was complete",
             )
-
+            self._record_result(task.id, result, result.status)
+            raise
         except Exception as e:
-            return AgentResult(
+            result = AgentResult(
                 task_id=task.id,
                 status=AgentStatus.FAILED,
                 error=f"Planning error: {str(e)}",
             )
+            self._record_result(task.id, result, result.status)
+            return
+
+        plan = parse_structured_response("".join(chunks))
+        result = self._plan_result(task, plan, cache_key)
+        self._record_result(task.id, result, result.status)
+
+    def _planning_prompt(self, task: AgentTask) -> Optional[str]:
+        """
+        Construct the planning prompt for a task.
+
+        Args:
+            task: The planning task
+
+        Returns:
+            The constructed prompt, or None if the task has no description
+        """
+        task_description = task.parameters.get("description", "")
+        if not task_description:
+            return None
+
+        return self._construct_planning_prompt(
+            task_description,
+            task.parameters.get("context", ""),
+            task.parameters.get("constraints", []),
+        )
+
+    def _plan_cache_key(self, prompt: str) -> str:
+        """
+        Build the cache key for a planning prompt.
+
+        Args:
+            prompt: The planning prompt
+
+        Returns:
+            The cache key
+        """
+        return make_cache_key(
+            model=self.ollama_client.model,
+            prompt=normalize_prompt(prompt),
+            system_prompt=_PLANNING_SYSTEM_PROMPT,
+            output_format=_PLAN_OUTPUT_FORMAT,
+            temperature=_PLANNING_TEMPERATURE,
+        )
+
+    def _plan_result(
+        self, task: AgentTask, plan: Dict[str, Any], cache_key: str
+    ) -> AgentResult:
+        """
+        Turn a generated plan into the task's result, caching it if it is valid.
+
+        Args:
+            task: The planning task
+            plan: The structured response generated for the task
+            cache_key: The cache key of the planning prompt
+
+        Returns:
+            The planning result
+        """
+        # Check if there was an error in generating the structured response
+        if "error" in plan:
+            return AgentResult(
+                task_id=task.id,
+                status=AgentStatus.FAILED,
+                error=f"Failed to generate structured plan: {plan.get('error')}",
+                result={"raw_response": plan.get("raw_response", "")},
+            )
+
+        self.response_cache.set(cache_key, plan)
+
+        return AgentResult(
+            task_id=task.id,
+            status=AgentStatus.COMPLETED,
+            result={"plan": plan},
+        )
 
     def _construct_planning_prompt(
         self, task_description: str, context: str, constraints: List[str]
@@ -144,23 +302,20 @@ class PlannerAgent(Agent):
         Returns:
             The constructed prompt
         """
-        prompt = (
+        parts = [
             f"Create a detailed plan for the following task:\n\n{task_description}\n\n"
-        )
+        ]
 
         if context:
-            prompt += f"Context:\n{context}\n\n"
+            parts.append(f"Context:\n{context}\n\n")
 
         if constraints:
-            prompt += "Constraints:\n"
-            for i, constraint in enumerate(constraints, 1):
-                prompt += f"{i}. {constraint}\n"
-            prompt += "\n"
-
-        prompt += (
-            "Create a comprehensive plan with clear, actionable steps. "
-            "Each step should have a specific outcome and be logically ordered. "
-            "Include any dependencies between steps and resources needed."
-        )
+            parts.append("Constraints:\n")
+            parts.extend(
+                f"{i}. {constraint}\n" for i, constraint in enumerate(constraints, 1)
+            )
+            parts.append("\n")
+
+        parts.append(_PLANNING_INSTRUCTIONS)
 
-        return prompt
+        return "".join(parts)
@@ -9,12 +9,13 @@ class AgentRegistry:
         self._agents[agent.name] = agent
 
     def get(self, name):
-        if name not in self._agents:
+        agent = self._agents.get(name)
+        if agent is None:
             raise ValueError(f"Agent {name} not found")
-        return self._agents.get(name)
+        return agent
 
     def list(self):
-        return self._agents.keys() or []
+        return self._agents.keys()
 
     def deregister(self, name):
         return self._agents.pop(name, None)
@@ -1,11 +1,12 @@
-# Agent status enum
+"""Core agent types shared by agents, the registry and the routers."""
+
 import uuid
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any
 
-from pydantic import BaseModel
-
 
+# Agent status enum
 class AgentStatus(str, Enum):
     IDLE = "idle"
     RUNNING = "running"
@@ -13,21 +14,18 @@ class AgentStatus(str, Enum):
     FAILED = "failed"
 
 
-# Agent task model
-class AgentTask(BaseModel):
-    id: str
+# Agent task model (requests are validated by the Pydantic models in the routers)
+@dataclass(slots=True, kw_only=True)
+class AgentTask:
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
     name: str
     description: str | None = None
-    parameters: dict[Any, Any] = {}
-
-    def __init__(self, **data):
-        if "id" not in data or data["id"] is None:
-            data["id"] = str(uuid.uuid4())
-        super().__init__(**data)
+    parameters: dict[Any, Any] = field(default_factory=dict)
 
 
 # Agent result model
-class AgentResult(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AgentResult:
     task_id: str
     status: AgentStatus
     result: dict[Any, Any] | None = None
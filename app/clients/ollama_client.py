@@ -1,10 +1,89 @@
 """Client for interacting with Ollama API."""
 
-import json
-import re
-from typing import Any, Dict, Optional
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
 
 import aiohttp
+import ijson
+import orjson
+
+from app.utils.cache import LRUCache, make_cache_key, normalize_prompt
+
+# ijson events that carry a complete value
+_SCALAR_EVENTS = frozenset({"string", "number", "boolean", "null"})
+
+
+def _extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the first JSON object embedded in free text, such as a fenced block.
+
+    The text is scanned once, keeping a stack of the offsets of open braces and
+    tracking string literals inside them. Each balanced span is parsed when its
+    closing brace is reached. A valid span is returned once no brace opened
+    before it is still open, since an enclosing span that parses starts earlier.
+
+    Args:
+        text: The text to search
+
+    Returns:
+        The parseable JSON object that starts earliest, or None if there is none
+    """
+    open_braces: list[int] = []
+    found: Optional[Dict[str, Any]] = None
+    found_start = len(text)
+    in_string = False
+    escape = False
+    for end, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == "{":
+            open_braces.append(end)
+        elif not open_braces:
+            # Quotes and stray braces in the surrounding prose are ignored
+            continue
+        elif char == '"':
+            in_string = True
+        elif char == "}":
+            start = open_braces.pop()
+            if start < found_start:
+                try:
+                    found = orjson.loads(text[start : end + 1])
+                    found_start = start
+                except orjson.JSONDecodeError:
+                    pass
+            if found is not None and not open_braces:
+                return found
+
+    # Braces left open never closed, so the best span inside them wins
+    return found
+
+
+async def _iter_lines(content: aiohttp.StreamReader) -> AsyncIterator[bytearray]:
+    """
+    Split a response body into lines as its chunks arrive.
+
+    Args:
+        content: The response body stream
+
+    Yields:
+        Each line without its trailing newline, including an unterminated last line
+    """
+    buffer = bytearray()
+    async for chunk in content.iter_any():
+        # Earlier bytes hold no newline, so only the new chunk needs scanning
+        start = len(buffer)
+        buffer.extend(chunk)
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield buffer[:end]
+            del buffer[: end + 1]
+            start = 0
+    if buffer:
+        yield buffer
 
 
 class OllamaClient:
@@ -21,16 +100,50 @@ class OllamaClient:
         self.base_url = base_url
         self.model = model
         self.api_url = f"{base_url}/api/generate"
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Responses to deterministic (temperature 0) calls, reused for an hour
+        self._response_cache = LRUCache(maxsize=1024, ttl=3600)
 
-    async def generate(
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the HTTP session, creating it on first use.
+
+        The session keeps a pool of keep-alive connections to Ollama that is
+        reused across requests.
+
+        Returns:
+            The client's HTTP session
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=32, limit_per_host=16, keepalive_timeout=60
+                )
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the HTTP session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "OllamaClient":
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def generate_stream(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 1000,
-    ) -> str:
+    ) -> AsyncIterator[str]:
         """
-        Generate a response from the model.
+        Stream a response from the model as it is generated.
 
         Args:
             prompt: The prompt to send to the model
@@ -38,8 +151,8 @@ class OllamaClient:
             temperature: Controls randomness (0.0 to 1.0)
             max_tokens: Maximum number of tokens to generate
 
-        Returns:
-            The generated text response
+        Yields:
+            Chunks of the generated text response
         """
         payload = {
             "model": self.model,
@@ -54,34 +167,182 @@ class OllamaClient:
         if system_prompt:
             payload["system"] = system_prompt
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Ollama API error: {error_text}")
+        session = self._get_session()
+        async with session.post(self.api_url, json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Ollama API error: {error_text}")
 
-                # Ollama returns a stream of JSON objects, one per line
-                full_response = ""
-                async for line_bytes in response.content:
-                    if not line_bytes:
+            # Ollama returns a stream of JSON objects, one per line
+            async with aclosing(_iter_lines(response.content)) as lines:
+                async for line_bytes in lines:
+                    # orjson parses the raw bytes, surrounding whitespace included
+                    try:
+                        data = orjson.loads(line_bytes)
+                    except orjson.JSONDecodeError:
                         continue
 
-                    try:
-                        line = line_bytes.decode("utf-8").strip()
-                        if not line:
-                            continue
-
-                        data = json.loads(line)
-                        if "response" in data:
-                            full_response += data["response"]
-
-                        # Check if this is the final response
-                        if data.get("done", False):
-                            break
-                    except (json.JSONDecodeError, UnicodeDecodeError):
+                    # On the final response, return the connection to the pool
+                    # before handing over the last chunk
+                    done = data.get("done", False)
+                    if done:
+                        response.release()
+
+                    if "response" in data:
+                        yield data["response"]
+
+                    if done:
+                        break
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+    ) -> str:
+        """
+        Generate a response from the model.
+
+        Args:
+            prompt: The prompt to send to the model
+            system_prompt: Optional system prompt to guide the model
+            temperature: Controls randomness (0.0 to 1.0)
+            max_tokens: Maximum number of tokens to generate
+
+        Returns:
+            The generated text response
+        """
+        # Only deterministic calls are cached, sampled output should vary
+        cache_key = None
+        if temperature == 0:
+            cache_key = make_cache_key(
+                model=self.model,
+                system_prompt=system_prompt,
+                prompt=normalize_prompt(prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                return cached_response
+
+        chunks = []
+        async for chunk in self.generate_stream(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        ):
+            chunks.append(chunk)
+
+        response = "".join(chunks)
+        if cache_key is not None:
+            self._response_cache.set(cache_key, response)
+
+        return response
+
+    async def _generate_until(
+        self,
+        stop_when: Callable[[Dict[str, Any]], bool],
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Generate a response while parsing it as JSON incrementally.
+
+        Top-level scalar fields are collected as soon as they are complete and
+        passed to stop_when after every chunk. Once it returns True the rest of
+        the stream is abandoned.
+
+        Args:
+            stop_when: Predicate over the top-level fields parsed so far
+            prompt: The prompt to send to the model
+            system_prompt: Optional system prompt to guide the model
+            temperature: Controls randomness (0.0 to 1.0)
+            max_tokens: Maximum number of tokens to generate
+
+        Returns:
+            The text received, and the parsed fields if generation stopped early
+        """
+        chunks = []
+        fields: Dict[str, Any] = {}
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        started = False
+
+        stream = self.generate_stream(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                # An empty chunk, as sent with the final response, would tell
+                # the parser that the input has ended
+                if parser is None or not chunk:
+                    continue
+
+                # Skip any preamble such as a ```json fence before the object
+                if not started:
+                    start = chunk.find("{")
+                    if start == -1:
                         continue
+                    chunk = chunk[start:]
+                    started = True
+
+                try:
+                    parser.send(chunk.encode("utf-8"))
+                except ijson.JSONError:
+                    # Leave it to the full parse once the response is complete
+                    parser = None
+                    continue
+
+                for prefix, event, value in events:
+                    if prefix and "." not in prefix and event in _SCALAR_EVENTS:
+                        fields[prefix] = value
+                del events[:]
+
+                if stop_when(fields):
+                    return "".join(chunks), fields
+        finally:
+            await stream.aclose()
 
-                return full_response
+        return "".join(chunks), None
+
+    @staticmethod
+    def _structured_system_prompt(
+        system_prompt: Optional[str], output_format: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        """
+        Append the output format instructions to a system prompt.
+
+        The format instructions go in the system prompt, which stays the same
+        across calls, so Ollama can reuse its cached prefix instead of
+        re-reading them after every new prompt.
+
+        Args:
+            system_prompt: Optional system prompt to guide the model
+            output_format: Expected output format structure
+
+        Returns:
+            The system prompt to send
+        """
+        if not output_format:
+            return system_prompt
+
+        format_prompt = (
+            "Your response must be a valid JSON object with the following structure:\n"
+            f"{orjson.dumps(output_format, option=orjson.OPT_INDENT_2).decode()}\n"
+            "Ensure your entire response can be parsed as JSON."
+        )
+        if system_prompt:
+            return f"{system_prompt}\n\n{format_prompt}"
+        return format_prompt
 
     async def generate_structured(
         self,
@@ -90,6 +351,7 @@ class OllamaClient:
         output_format: Optional[Dict[str, Any]] = None,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
     ) -> Dict[str, Any]:
         """
         Generate a structured response from the model.
@@ -100,65 +362,125 @@ class OllamaClient:
             output_format: Expected output format structure
             temperature: Controls randomness (0.0 to 1.0)
             max_tokens: Maximum number of tokens to generate
+            stop_when: Optional predicate over the top-level fields parsed so
+                far; when it returns True generation is cut short and those
+                fields are returned
 
         Returns:
             The generated response as a structured dictionary
         """
-        format_prompt = ""
-        if output_format:
-            format_prompt = (
-                "\nYour response must be a valid JSON object with the following structure:\n"
-                f"{json.dumps(output_format, indent=2)}\n"
-                "Ensure your entire response can be parsed as JSON."
+        system_prompt = self._structured_system_prompt(system_prompt, output_format)
+
+        if stop_when is None:
+            response_text = await self.generate(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        else:
+            response_text, fields = await self._generate_until(
+                stop_when,
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
             )
+            if fields is not None:
+                return fields
 
-        full_prompt = f"{prompt}{format_prompt}"
+        return parse_structured_response(response_text)
 
-        response_text = await self.generate(
-            prompt=full_prompt,
-            system_prompt=system_prompt,
+    def generate_structured_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        output_format: Optional[Dict[str, Any]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a structured response from the model as it is generated.
+
+        The joined chunks can be parsed with parse_structured_response.
+
+        Args:
+            prompt: The prompt to send to the model
+            system_prompt: Optional system prompt to guide the model
+            output_format: Expected output format structure
+            temperature: Controls randomness (0.0 to 1.0)
+            max_tokens: Maximum number of tokens to generate
+
+        Returns:
+            An iterator over chunks of the generated text response
+        """
+        return self.generate_stream(
+            prompt=prompt,
+            system_prompt=self._structured_system_prompt(system_prompt, output_format),
             temperature=temperature,
             max_tokens=max_tokens,
         )
 
-        # Extract JSON from the response
-        try:
-            # Try to parse the entire response as JSON
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            # If that fails, try to find JSON within the response
-            try:
-                # Look for content between triple backticks
-                json_match = response_text.split("```json")
-                if len(json_match) > 1:
-                    json_content = json_match[1].split("```")[0].strip()
-                    return json.loads(json_content)
-
-                # Look for content between single backticks
-                json_match = response_text.split("`")
-                if len(json_match) > 1:
-                    for i in range(1, len(json_match), 2):
-                        try:
-                            return json.loads(json_match[i])
-                        except json.JSONDecodeError:
-                            continue
-
-                # Last resort: try to find anything that looks like JSON
-
-                # Find JSON objects using a simpler pattern that works in Python
-                json_pattern = r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}"
-                matches = re.findall(json_pattern, response_text)
-                if matches:
-                    for match in matches:
-                        try:
-                            return json.loads(match)
-                        except json.JSONDecodeError:
-                            continue
-
-                # If all else fails, return the raw text
-                return {"error": "Could not parse JSON", "raw_response": response_text}
-            except Exception as e:
-                return {
-                    "error": f"JSON parsing error: {str(e)}",
-                    "raw_response": response_text,
-                }
+
+def parse_structured_response(response_text: str) -> Dict[str, Any]:
+    """
+    Parse a structured response generated by the model.
+
+    Args:
+        response_text: The generated text response
+
+    Returns:
+        The parsed response, or the error and raw text if it is not valid JSON
+    """
+    # Extract JSON from the response
+    try:
+        # Try to parse the entire response as JSON
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError:
+        pass
+
+    # If that fails, look for a JSON object within the response
+    parsed = _extract_json_object(response_text)
+    if parsed is not None:
+        return parsed
+
+    # If all else fails, return the raw text
+    return {"error": "Could not parse JSON", "raw_response": response_text}
+
+
+_clients: Dict[Tuple[str, str], OllamaClient] = {}
+
+
+def get_ollama_client(
+    base_url: str = "http://localhost:11434", model: str = "gemma3"
+) -> OllamaClient:
+    """
+    Get the shared client for a base URL and model, creating it on first use.
+
+    Agents talking to the same Ollama server share one client, and with it one
+    pool of keep-alive connections.
+
+    Args:
+        base_url: Base URL for the Ollama API
+        model: The model to use for generation
+
+    Returns:
+        The shared Ollama client
+    """
+    key = (base_url, model)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = OllamaClient(base_url=base_url, model=model)
+    return client
+
+
+def open_ollama_clients() -> None:
+    """Open the HTTP sessions of all shared clients ahead of the first request."""
+    for client in _clients.values():
+        client._get_session()
+
+
+async def close_ollama_clients() -> None:
+    """Close the HTTP sessions of all shared clients."""
+    for client in _clients.values():
+        await client.close()
@@ -1,9 +1,60 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import RedirectResponse
 
+from .agents.base import shutdown_process_pool
+from .agents.calculator.calculator_agent import CalculatorAgent
+from .agents.data_processing_example.data_processing_agent import DataProcessingAgent
+from .agents.executor.executor_agent import ExecutorAgent
+from .agents.planner.planner_agent import PlannerAgent
+from .agents.registry import AgentRegistry
+from .clients.ollama_client import close_ollama_clients, open_ollama_clients
 from .routers import agents_router, healthz_router, planner_executor_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Register the agents on startup and release their resources on shutdown."""
+    agent_registry = AgentRegistry()
+    agent_registry.register(
+        DataProcessingAgent(
+            name="data_processing_agent", description="An agent that processes data."
+        )
+    )
+    agent_registry.register(
+        CalculatorAgent(
+            name="calculator_agent",
+            description="An agent that performs arithmetic calculations.",
+        )
+    )
+    agent_registry.register(
+        PlannerAgent(
+            name="planner_agent",
+            description="An agent that creates structured plans using Llama via Ollama.",
+        )
+    )
+    agent_registry.register(
+        ExecutorAgent(
+            name="executor_agent",
+            description="An agent that executes plans using Llama via Ollama.",
+        )
+    )
+    app.state.agent_registry = agent_registry
+
+    # Open the connection pools of the shared Ollama clients
+    open_ollama_clients()
+    yield
+    await close_ollama_clients()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Compress large JSON bodies such as plans and step results. Server-sent event
+# streams are left uncompressed so each event is flushed as soon as it is sent.
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 
 @app.get("/", include_in_schema=False)
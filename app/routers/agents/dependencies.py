@@ -0,0 +1,26 @@
+"""Dependencies shared by the agent routers."""
+
+from fastapi import Depends, Request
+
+from app.agents.executor.executor_agent import ExecutorAgent
+from app.agents.planner.planner_agent import PlannerAgent
+from app.agents.registry import AgentRegistry
+
+
+def get_agent_registry(request: Request) -> AgentRegistry:
+    """Get the agent registry created by the application lifespan."""
+    return request.app.state.agent_registry
+
+
+def get_planner_agent(
+    agent_registry: AgentRegistry = Depends(get_agent_registry),
+) -> PlannerAgent:
+    """Get the registered planner agent."""
+    return agent_registry.get("planner_agent")
+
+
+def get_executor_agent(
+    agent_registry: AgentRegistry = Depends(get_agent_registry),
+) -> ExecutorAgent:
+    """Get the registered executor agent."""
+    return agent_registry.get("executor_agent")
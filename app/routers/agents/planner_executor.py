@@ -1,15 +1,19 @@
 """Planner and Executor router for the API."""
 
-from typing import Any, Dict, List
+import dataclasses
+from typing import Any, AsyncIterator, Dict, List
 
-from fastapi import APIRouter, BackgroundTasks
+import orjson
+from fastapi import APIRouter, Depends, Query
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.agents.executor.executor_agent import ExecutorAgent
+from app.agents.base import Agent
+from app.agents.executor.executor_agent import ExecutorAgent, StepResult
 from app.agents.planner.planner_agent import PlannerAgent
-from app.agents.registry import AgentRegistry
 from app.agents.types import AgentResult, AgentStatus, AgentTask
+from app.routers.agents.dependencies import get_executor_agent, get_planner_agent
 from app.routers.agents.types import TaskResponse
 
 
@@ -33,39 +37,138 @@ class ExecuteStepRequest(BaseModel):
 # Create router
 router = APIRouter(prefix="/planner", tags=["planner"])
 
-# Initialize agents
-planner_agent = PlannerAgent(
-    name="planner_agent",
-    description="An agent that creates structured plans using Llama via Ollama.",
-)
 
-executor_agent = ExecutorAgent(
-    name="executor_agent",
-    description="An agent that executes plans using Llama via Ollama.",
+def _sse_event(data: Any, event: str | None = None) -> bytes:
+    """Encode a server-sent event with a JSON payload."""
+    payload = orjson.dumps(data).decode()
+    if event is None:
+        return f"data: {payload}\n\n".encode()
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+def _step_preview(step: StepResult, preview: int | None) -> StepResult | Dict[str, Any]:
+    """A step result with its output cut to ``preview`` characters, if given."""
+    if preview is None:
+        return step
+    # Steps that failed before producing any output may have none
+    output = step.output or ""
+    fields = dataclasses.asdict(step)
+    fields["output"] = output[:preview]
+    fields["output_length"] = len(output)
+    return fields
+
+
+# Clients that only show a preview of each step's output can ask for just that
+_PreviewQuery = Query(
+    None, ge=0, description="Only return this many characters of each step's output"
 )
 
-# Register agents in the registry
-agent_registry = AgentRegistry()
-agent_registry.register(planner_agent)
-agent_registry.register(executor_agent)
+
+# How long an event stream waits for a status change before repeating the status
+_EVENTS_WAIT = 15.0
+
+
+async def _status_events(agent: Agent, task_id: str) -> AsyncIterator[bytes]:
+    """Stream a task's result as server-sent events until it finishes."""
+    while True:
+        try:
+            result = await agent.wait_for_task(task_id, timeout=_EVENTS_WAIT)
+        except ValueError as e:
+            # The task was evicted while we were waiting
+            yield _sse_event({"detail": str(e)}, event="error")
+            return
+
+        yield _sse_event(result)
+        if result.status in (AgentStatus.COMPLETED, AgentStatus.FAILED):
+            return
+
+
+async def _execution_events(
+    executor_agent: ExecutorAgent, task_id: str, preview: int | None = None
+) -> AsyncIterator[bytes]:
+    """Stream an execution task's step results as server-sent events as they complete."""
+    sent: set[str] = set()
+
+    def unsent_steps(result: AgentResult) -> List[StepResult]:
+        progress = result.result or {}
+        return [
+            step
+            for step in progress.get("step_results", [])
+            if step.step_id not in sent
+        ]
+
+    while True:
+        try:
+            # Steps recorded while the last events were being sent woke nobody,
+            # so send those before waiting for the next update
+            result = executor_agent.get_result(task_id)
+            new_steps = unsent_steps(result)
+            if not new_steps and result.status == AgentStatus.RUNNING:
+                result = await executor_agent.wait_for_update(
+                    task_id, timeout=_EVENTS_WAIT
+                )
+                new_steps = unsent_steps(result)
+        except ValueError as e:
+            # The task was evicted while we were waiting
+            yield _sse_event({"detail": str(e)}, event="error")
+            return
+
+        progress = result.result or {}
+        for step in new_steps:
+            sent.add(step.step_id)
+            yield _sse_event(_step_preview(step, preview), event="step")
+
+        if result.status in (AgentStatus.COMPLETED, AgentStatus.FAILED):
+            # Steps were already sent one by one, so only the outcome is left
+            summary = {
+                "task_id": result.task_id,
+                "status": result.status,
+                "error": result.error,
+                "steps_completed": progress.get("steps_completed"),
+                "total_steps": progress.get("total_steps"),
+            }
+            yield _sse_event(summary, event="result")
+            return
+
+        if not new_steps:
+            # Keep the connection alive while a slow step runs
+            yield b": keep-alive\n\n"
+
+
+async def _plan_events(
+    planner_agent: PlannerAgent, task: AgentTask, chunks: AsyncIterator[str]
+) -> AsyncIterator[bytes]:
+    """Stream a planning task's output chunks as server-sent events."""
+    yield _sse_event({"task_id": task.id}, event="task")
+    async for chunk in chunks:
+        yield _sse_event({"chunk": chunk})
+    yield _sse_event(planner_agent.get_result(task.id), event="result")
+
+
+def _plan_task(request: PlanRequest) -> AgentTask:
+    """Build the planning task for a plan request."""
+    return AgentTask(
+        name="create_plan",
+        description=f"Create a plan for: {request.description}",
+        parameters={
+            "description": request.description,
+            "context": request.context,
+            "constraints": request.constraints,
+        },
+    )
 
 
 @router.post("/create", response_model=TaskResponse)
-async def create_plan(request: PlanRequest, background_tasks: BackgroundTasks):
+async def create_plan(
+    request: PlanRequest,
+    planner_agent: PlannerAgent = Depends(get_planner_agent),
+):
     """Create a new plan."""
     try:
-        task = AgentTask(
-            name="create_plan",
-            description=f"Create a plan for: {request.description}",
-            parameters={
-                "description": request.description,
-                "context": request.context,
-                "constraints": request.constraints,
-            },
-        )
+        task = _plan_task(request)
 
         # Run the task in the background
-        background_tasks.add_task(planner_agent.run_task, task)
+        planner_agent.submit_task(task)
 
         return TaskResponse(
             task_id=task.id, agent_name="planner_agent", status=AgentStatus.RUNNING
@@ -74,8 +177,26 @@ async def create_plan(request: PlanRequest, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/create/stream")
+async def create_plan_stream(
+    request: PlanRequest, planner_agent: PlannerAgent = Depends(get_planner_agent)
+):
+    """Create a new plan, streaming the model output as server-sent events."""
+    task = _plan_task(request)
+    # Starts tracking the task, so it can be polled as soon as the ID is sent
+    chunks = planner_agent.stream_task(task)
+    return StreamingResponse(
+        _plan_events(planner_agent, task, chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Task-ID": task.id},
+    )
+
+
 @router.post("/execute", response_model=TaskResponse)
-async def execute_plan(request: ExecutePlanRequest, background_tasks: BackgroundTasks):
+async def execute_plan(
+    request: ExecutePlanRequest,
+    executor_agent: ExecutorAgent = Depends(get_executor_agent),
+):
     """Execute a plan."""
     try:
         task = AgentTask(
@@ -88,7 +209,7 @@ async def execute_plan(request: ExecutePlanRequest, background_tasks: Background
         )
 
         # Run the task in the background
-        background_tasks.add_task(executor_agent.run_task, task)
+        executor_agent.submit_task(task)
 
         return TaskResponse(
             task_id=task.id, agent_name="executor_agent", status=AgentStatus.RUNNING
@@ -98,7 +219,10 @@ async def execute_plan(request: ExecutePlanRequest, background_tasks: Background
 
 
 @router.post("/execute-step", response_model=TaskResponse)
-async def execute_step(request: ExecuteStepRequest, background_tasks: BackgroundTasks):
+async def execute_step(
+    request: ExecuteStepRequest,
+    executor_agent: ExecutorAgent = Depends(get_executor_agent),
+):
     """Execute a single step."""
     try:
         task = AgentTask(
@@ -111,7 +235,7 @@ async def execute_step(request: ExecuteStepRequest, background_tasks: Background
         )
 
         # Run the task in the background
-        background_tasks.add_task(executor_agent.run_task, task)
+        executor_agent.submit_task(task)
 
         return TaskResponse(
             task_id=task.id, agent_name="executor_agent", status=AgentStatus.RUNNING
@@ -121,7 +245,9 @@ async def execute_step(request: ExecuteStepRequest, background_tasks: Background
 
 
 @router.get("/plan/{task_id}", response_model=AgentResult)
-async def get_plan_result(task_id: str):
+async def get_plan_result(
+    task_id: str, planner_agent: PlannerAgent = Depends(get_planner_agent)
+):
     """Get the result of a planning task."""
     try:
         return planner_agent.get_result(task_id)
@@ -131,12 +257,60 @@ async def get_plan_result(task_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/plan/{task_id}/events")
+async def get_plan_events(
+    task_id: str, planner_agent: PlannerAgent = Depends(get_planner_agent)
+):
+    """Stream the status of a planning task as server-sent events until it finishes."""
+    try:
+        planner_agent.get_result(task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return StreamingResponse(
+        _status_events(planner_agent, task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @router.get("/execution/{task_id}", response_model=AgentResult)
-async def get_execution_result(task_id: str):
+async def get_execution_result(
+    task_id: str,
+    preview: int | None = _PreviewQuery,
+    executor_agent: ExecutorAgent = Depends(get_executor_agent),
+):
     """Get the result of an execution task."""
     try:
-        return executor_agent.get_result(task_id)
+        result = executor_agent.get_result(task_id)
+        if preview is None or not result.result or "step_results" not in result.result:
+            return result
+        step_results = [
+            _step_preview(step, preview) for step in result.result["step_results"]
+        ]
+        return dataclasses.replace(
+            result, result={**result.result, "step_results": step_results}
+        )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/execution/{task_id}/stream")
+async def get_execution_stream(
+    task_id: str,
+    preview: int | None = _PreviewQuery,
+    executor_agent: ExecutorAgent = Depends(get_executor_agent),
+):
+    """Stream the step results of an execution task as server-sent events."""
+    try:
+        executor_agent.get_result(task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return StreamingResponse(
+        _execution_events(executor_agent, task_id, preview),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,98 @@
+"""In-memory caches for expensive, repeatable calls."""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+
+class LRUCache:
+    """Size-bounded cache that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries to keep
+            ttl: Optional number of seconds after which an entry expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Each entry is stored with its expiry time, or None if it never expires
+        self._entries: OrderedDict[str, tuple[Optional[float], Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value and mark it as recently used.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting the oldest entry when the cache is full.
+
+        Args:
+            key: The cache key
+            value: The value to cache
+        """
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt for use in a cache key.
+
+    Prompts that differ only in case or whitespace map to the same key; the
+    original prompt is still what gets sent to the model.
+
+    Args:
+        prompt: The prompt to normalize
+
+    Returns:
+        The lowercased prompt with runs of whitespace collapsed to one space
+    """
+    return _WHITESPACE_RE.sub(" ", prompt.strip().lower())
+
+
+def make_cache_key(**fields: Any) -> str:
+    """
+    Build a stable cache key from keyword fields.
+
+    Args:
+        **fields: JSON-serializable values identifying the cached call
+
+    Returns:
+        A hex digest of the fields
+    """
+    payload = orjson.dumps(fields, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
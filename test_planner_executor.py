@@ -8,23 +8,67 @@ It creates a plan, retrieves the plan result, and then executes the plan.
 Requirements:
 - Ollama must be running with the gemma3 model available
 - The API server must be running
+- The h2 package, from the dev dependency group, for HTTP/2 support
+- Optionally uvloop, which replaces the default event loop when installed
 
 Usage:
-    python test_planner_executor.py
+    python test_planner_executor.py [--no-cache] [--backend {httpx,aiohttp}] [-q | -v]
 """
 
+import argparse
 import asyncio
+import hashlib
+import logging
+import sys
+import weakref
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
 
+import aiohttp
 import httpx
+import orjson
 
+try:
+    # Installed with uvicorn[standard] on platforms other than Windows
+    import uvloop
+except ImportError:
+    uvloop = None
 
-async def main():
-    """Run the test."""
-    base_url = "http://localhost:8000"
+BASE_URL = "http://localhost:8000"
+
+# Keep-alive connections are reused across the create, poll and execute requests
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=16)
+HTTP_TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=5.0, pool=5.0)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# API routes, relative to BASE_URL
+CREATE_PLAN_PATH = "/planner/create"
+EXECUTE_PATH = "/planner/execute"
+PLAN_PATH = "/planner/plan/{task_id}"
+EXECUTION_PATH = "/planner/execution/{task_id}"
+
+# Per-request caps so a stalled server cannot hang the script
+CREATE_TIMEOUT = 10.0
+POLL_TIMEOUT = 5.0
+# Event streams stay open until the task finishes, so only reads are unbounded
+STREAM_TIMEOUT = httpx.Timeout(connect=5.0, read=None, write=5.0, pool=5.0)
+
+# Characters of each step's output to show, the server trims the rest
+OUTPUT_PREVIEW = 100
+
+# Wall-clock budget for waiting on a single planning or execution task
+TASK_TIMEOUT = 300.0
+
+# Poll quickly at first so fast tasks are picked up early, then back off
+_POLL_DELAYS = (0.2, 0.2, 0.5, 0.5, 1.0)
+# Tasks due for a poll within this many seconds of each other share a batch
+_POLL_BATCH_WINDOW = 0.1
 
-    # Create a plan
-    print("Creating a plan...")
-    plan_request = {
+# The plans the script creates and executes
+PLAN_REQUESTS = [
+    {
         "description": "Build a simple web application with a login page and dashboard",
         "context": "The application should use modern web technologies and follow best practices.",
         "constraints": [
@@ -32,94 +76,565 @@ async def main():
             "Should have proper error handling",
             "Must follow security best practices",
         ],
-    }
+    },
+]
+
+# Request bodies, encoded once with sorted keys so they double as cache keys
+PLAN_REQUEST_BODIES = [
+    orjson.dumps(plan_request, option=orjson.OPT_SORT_KEYS)
+    for plan_request in PLAN_REQUESTS
+]
+
+# Plans from earlier runs, keyed by a hash of the plan request
+PLAN_CACHE_DIR = Path("~/.cache/agentea/plans").expanduser()
+
+# Connection pool for the aiohttp backend, sized like HTTP_LIMITS
+AIOHTTP_LIMIT = 16
+AIOHTTP_KEEPALIVE = 60.0
+
+log = logging.getLogger(__name__)
+
+_client: "httpx.AsyncClient | AiohttpClient | None" = None
+
+
+class TaskFailedError(Exception):
+    """An agent task finished with a failed status."""
+
+    failure = "Task failed"
+
+    def __init__(self, error: str | None):
+        super().__init__(f"{self.failure}: {error}")
+        self.error = error
+
+
+class PlanFailedError(TaskFailedError):
+    """The planning task failed."""
+
+    failure = "Plan generation failed"
+
+
+class ExecutionFailedError(TaskFailedError):
+    """The execution task failed."""
+
+    failure = "Execution failed"
+
+
+def _poll_delay(attempt: int) -> float:
+    """Seconds to wait before the next status check."""
+    return _POLL_DELAYS[attempt] if attempt < len(_POLL_DELAYS) else _POLL_DELAYS[-1]
 
-    async with httpx.AsyncClient() as client:
-        # Create the plan
-        response = await client.post(f"{base_url}/planner/create", json=plan_request)
-        response.raise_for_status()
-        plan_task = response.json()
-        plan_task_id = plan_task["task_id"]
-
-        print(f"Plan task created with ID: {plan_task_id}")
-        print("Waiting for plan to be generated...")
-
-        # Poll for the plan result
-        plan_result = None
-        while True:
-            response = await client.get(f"{base_url}/planner/plan/{plan_task_id}")
-            response.raise_for_status()
-            result = response.json()
-
-            if result["status"] == "completed":
-                plan_result = result["result"]["plan"]
-                break
-            elif result["status"] == "failed":
-                print(f"Plan generation failed: {result.get('error')}")
-                return
 
-            print("Plan still generating...")
-            await asyncio.sleep(2)
-
-        # Print the plan
-        print("\nPlan generated successfully:")
-        print(f"Title: {plan_result['title']}")
-        print(f"Description: {plan_result['description']}")
-        print("\nSteps:")
-        for step in plan_result["steps"]:
-            print(f"- {step['title']}: {step['description']}")
-
-        # Execute the plan
-        print("\nExecuting the plan...")
-        execute_request = {
-            "plan": plan_result,
-            "context": "Execute this plan with detailed explanations for each step.",
-        }
-
-        response = await client.post(
-            f"{base_url}/planner/execute", json=execute_request
+class AiohttpResponse:
+    """The parts of httpx.Response the script reads, over an aiohttp response."""
+
+    def __init__(self, response: aiohttp.ClientResponse, content: bytes = b""):
+        self._response = response
+        self.status_code = response.status
+        self.content = content
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
+
+    async def aiter_lines(self) -> AsyncIterator[str]:
+        # Split the chunks ourselves, aiohttp's line reader rejects long lines
+        buffer = bytearray()
+        try:
+            async for chunk in self._response.content.iter_any():
+                start = len(buffer)
+                buffer.extend(chunk)
+                while (end := buffer.find(b"\n", start)) != -1:
+                    yield buffer[:end].decode().rstrip("\r")
+                    del buffer[: end + 1]
+                    start = 0
+        except TimeoutError as e:
+            raise httpx.ReadTimeout(str(e)) from e
+        if buffer:
+            yield buffer.decode().rstrip("\r")
+
+
+class AiohttpClient:
+    """
+    The subset of httpx.AsyncClient the script uses, backed by aiohttp.
+
+    aiohttp has less per-request overhead than httpx under many concurrent
+    requests to one host. Timeouts are raised as httpx.ReadTimeout so the rest
+    of the script handles both backends the same way.
+    """
+
+    def __init__(self, base_url: str):
+        self._session = aiohttp.ClientSession(
+            base_url=base_url,
+            connector=aiohttp.TCPConnector(
+                limit=AIOHTTP_LIMIT, keepalive_timeout=AIOHTTP_KEEPALIVE
+            ),
+            timeout=self._timeout(HTTP_TIMEOUT),
         )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._session.closed
+
+    async def aclose(self):
+        await self._session.close()
+
+    @staticmethod
+    def _timeout(timeout: float | httpx.Timeout) -> aiohttp.ClientTimeout:
+        """Convert an httpx timeout, which caps each phase rather than the total."""
+        if not isinstance(timeout, httpx.Timeout):
+            timeout = httpx.Timeout(timeout)
+        return aiohttp.ClientTimeout(connect=timeout.connect, sock_read=timeout.read)
+
+    async def _request(self, method: str, path: str, **kwargs) -> AiohttpResponse:
+        timeout = kwargs.pop("timeout", HTTP_TIMEOUT)
+        try:
+            async with self._session.request(
+                method, path, timeout=self._timeout(timeout), **kwargs
+            ) as response:
+                return AiohttpResponse(response, await response.read())
+        except TimeoutError as e:
+            raise httpx.ReadTimeout(str(e)) from e
+
+    async def get(self, path: str, **kwargs) -> AiohttpResponse:
+        return await self._request("GET", path, **kwargs)
+
+    async def post(self, path: str, *, content: bytes, **kwargs) -> AiohttpResponse:
+        return await self._request("POST", path, data=content, **kwargs)
+
+    @asynccontextmanager
+    async def stream(
+        self, method: str, path: str, *, timeout: float | httpx.Timeout = HTTP_TIMEOUT
+    ) -> AsyncIterator[AiohttpResponse]:
+        try:
+            response = await self._session.request(
+                method, path, timeout=self._timeout(timeout)
+            )
+        except TimeoutError as e:
+            raise httpx.ReadTimeout(str(e)) from e
+        async with response:
+            yield AiohttpResponse(response)
+
+
+def get_client(backend: str = "httpx") -> "httpx.AsyncClient | AiohttpClient":
+    """Get the shared API client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        if backend == "aiohttp":
+            _client = AiohttpClient(BASE_URL)
+        else:
+            # HTTP/2 is negotiated over TLS, so over plain HTTP this stays on HTTP/1.1
+            _client = httpx.AsyncClient(
+                base_url=BASE_URL, http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+            )
+    return _client
+
+
+async def wait_for_events(client: httpx.AsyncClient, path: str) -> dict | None:
+    """
+    Wait for a task to finish by following its server-sent status events.
+
+    Returns the final result, or None if the server has no events route for the
+    task so the caller should poll instead.
+    """
+    async with client.stream(
+        "GET", f"{path}/events", timeout=STREAM_TIMEOUT
+    ) as response:
+        if response.status_code == 404:
+            return None
         response.raise_for_status()
-        execute_task = response.json()
-        execute_task_id = execute_task["task_id"]
 
-        print(f"Execution task created with ID: {execute_task_id}")
-        print("Waiting for execution to complete...")
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                result = orjson.loads(line[6:])
+                if result.get("status") in ("completed", "failed"):
+                    return result
+
+    return None
+
+
+async def create_plan(client: httpx.AsyncClient, plan_body: bytes) -> str:
+    """Start a planning task from an encoded plan request and return its ID."""
+    response = await client.post(
+        CREATE_PLAN_PATH,
+        content=plan_body,
+        headers=JSON_HEADERS,
+        timeout=CREATE_TIMEOUT,
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)["task_id"]
+
+
+def _task_result(result: dict, failed: type[TaskFailedError]) -> dict | None:
+    """Return a task's result once it completes, raising if the task failed."""
+    status = result["status"]
+    if status == "completed":
+        return result["result"]
+    if status == "failed":
+        raise failed(result.get("error"))
+    return None
 
-        # Poll for the execution result
-        while True:
-            response = await client.get(
-                f"{base_url}/planner/execution/{execute_task_id}"
+
+@dataclass(eq=False, slots=True)
+class _Waiter:
+    """A task waiting on a StatusPoller, with its own backoff."""
+
+    path: str
+    failed: type[TaskFailedError]
+    progress: str
+    future: asyncio.Future
+    attempts: int = 0
+    next_poll: float = 0.0
+
+
+class StatusPoller:
+    """
+    Polls every waiting task on one client together.
+
+    Each task keeps its own escalating delay, and every tick sends the status
+    requests of all tasks that are due concurrently, so N tasks share the
+    client's ticks instead of each sleeping on its own.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self._client = client
+        self._waiting: set[_Waiter] = set()
+        self._joined = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+
+    async def wait(
+        self, path: str, failed: type[TaskFailedError], progress: str
+    ) -> dict:
+        """Wait for the task at ``path`` to finish and return its result."""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(path, failed, progress, loop.create_future(), 0, loop.time())
+        self._waiting.add(waiter)
+        # A new task is polled straight away, not after the current sleep
+        self._joined.set()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        try:
+            return await waiter.future
+        finally:
+            # Stop polling a task whose waiter was cancelled or timed out
+            self._waiting.discard(waiter)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._waiting:
+            self._joined.clear()
+            # Tasks that are nearly due are polled in the same batch
+            horizon = loop.time() + _POLL_BATCH_WINDOW
+            due = [waiter for waiter in self._waiting if waiter.next_poll <= horizon]
+
+            responses = await asyncio.gather(
+                *(self._client.get(w.path, timeout=POLL_TIMEOUT) for w in due),
+                return_exceptions=True,
             )
-            response.raise_for_status()
-            result = response.json()
-
-            if result["status"] == "completed":
-                execution_result = result["result"]
-                break
-            elif result["status"] == "failed":
-                print(f"Execution failed: {result.get('error')}")
+            for waiter, response in zip(due, responses):
+                if waiter not in self._waiting:
+                    continue
+                self._poll_done(waiter, response, loop.time())
+
+            if self._waiting:
+                delay = min(w.next_poll for w in self._waiting) - loop.time()
+                try:
+                    await asyncio.wait_for(self._joined.wait(), max(delay, 0.0))
+                except TimeoutError:
+                    pass
+
+    def _poll_done(self, waiter: _Waiter, response: object, now: float):
+        """Resolve a waiter from its poll response, or schedule its next poll."""
+        if isinstance(response, httpx.ReadTimeout):
+            # A single slow poll is harmless, try again after the delay
+            task_result = None
+        else:
+            try:
+                if isinstance(response, BaseException):
+                    raise response
+                response.raise_for_status()
+                task_result = _task_result(
+                    orjson.loads(response.content), waiter.failed
+                )
+            except Exception as e:
+                self._waiting.discard(waiter)
+                waiter.future.set_exception(e)
                 return
 
-            print("Execution in progress...")
-            await asyncio.sleep(2)
+        if task_result is not None:
+            self._waiting.discard(waiter)
+            waiter.future.set_result(task_result)
+            return
+
+        log.debug(waiter.progress)
+        waiter.next_poll = now + _poll_delay(waiter.attempts)
+        waiter.attempts += 1
+
+
+_pollers: weakref.WeakKeyDictionary[httpx.AsyncClient, StatusPoller] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def poll_until_done(
+    client: httpx.AsyncClient,
+    path: str,
+    *,
+    failed: type[TaskFailedError] = TaskFailedError,
+    progress: str = "Task in progress...",
+    overall_timeout: float = TASK_TIMEOUT,
+) -> dict:
+    """
+    Poll a task's status until it finishes and return its result.
+
+    Tasks polled on the same client are batched so each tick checks all of them
+    at once. Raises ``failed`` if the task fails, or TimeoutError if it is still
+    running after ``overall_timeout`` seconds.
+    """
+    poller = _pollers.get(client)
+    if poller is None:
+        poller = _pollers[client] = StatusPoller(client)
+    async with asyncio.timeout(overall_timeout):
+        return await poller.wait(path, failed, progress)
+
+
+async def wait_plan(client: httpx.AsyncClient, task_id: str) -> dict:
+    """Wait for a planning task to finish and return its result."""
+    plan_path = PLAN_PATH.format(task_id=task_id)
+
+    # Follow the status events, polling if the server cannot stream them
+    async with asyncio.timeout(TASK_TIMEOUT):
+        result = await wait_for_events(client, plan_path)
+    if result is not None:
+        return _task_result(result, PlanFailedError)
+
+    return await poll_until_done(
+        client, plan_path, failed=PlanFailedError, progress="Plan still generating..."
+    )
+
+
+async def create_execution(client: httpx.AsyncClient, plan: dict) -> str:
+    """Start executing a plan and return the execution task ID."""
+    execute_request = {
+        "plan": plan,
+        "context": "Execute this plan with detailed explanations for each step.",
+    }
+    response = await client.post(
+        EXECUTE_PATH,
+        content=orjson.dumps(execute_request),
+        headers=JSON_HEADERS,
+        timeout=CREATE_TIMEOUT,
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)["task_id"]
+
+
+async def wait_execution(client: httpx.AsyncClient, task_id: str) -> dict:
+    """Wait for an execution task to finish and return its result."""
+    return await poll_until_done(
+        client,
+        EXECUTION_PATH.format(task_id=task_id) + f"?preview={OUTPUT_PREVIEW}",
+        failed=ExecutionFailedError,
+        progress="Execution in progress...",
+    )
+
 
-        # Print the execution results
-        print("\nExecution completed successfully:")
-        print(
-            f"Steps completed: {execution_result['steps_completed']} of {execution_result['total_steps']}"
+def _plan_cache_path(plan_body: bytes) -> Path:
+    """Path of the cached plan for an encoded plan request."""
+    key = hashlib.blake2b(plan_body, digest_size=16).hexdigest()
+    return PLAN_CACHE_DIR / f"{key}.json"
+
+
+async def stream_execution(client: httpx.AsyncClient, task_id: str) -> dict | None:
+    """
+    Print an execution's step results as the server streams them.
+
+    Returns the outcome with the step counts, or None if the server cannot
+    stream the execution so the caller should poll instead. Raises
+    ExecutionFailedError if the execution fails.
+    """
+    steps_completed = 0
+    async with (
+        asyncio.timeout(TASK_TIMEOUT),
+        client.stream(
+            "GET",
+            EXECUTION_PATH.format(task_id=task_id)
+            + f"/stream?preview={OUTPUT_PREVIEW}",
+            timeout=STREAM_TIMEOUT,
+        ) as response,
+    ):
+        if response.status_code in (404, 405):
+            return None
+        response.raise_for_status()
+
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = orjson.loads(line[6:])
+                if event == "step":
+                    lines = step_lines(data)
+                    if steps_completed == 0:
+                        lines.insert(0, "\nStep results:")
+                    steps_completed += 1
+                    log.info("\n".join(lines))
+                elif event == "result":
+                    if data["status"] == "failed":
+                        raise ExecutionFailedError(data.get("error"))
+                    data["steps_completed"] = steps_completed
+                    return data
+                event = None
+
+    return None
+
+
+async def flow(
+    client: httpx.AsyncClient, plan_body: bytes, use_cache: bool = True
+) -> dict | None:
+    """Create a plan, or reuse a cached one, execute it and return the execution result."""
+    try:
+        return await _plan_and_execute(client, plan_body, use_cache)
+    except TaskFailedError as e:
+        log.error(e)
+        return None
+
+
+async def _plan_and_execute(
+    client: httpx.AsyncClient, plan_body: bytes, use_cache: bool
+) -> dict:
+    """Run one plan and execute flow, raising if either task fails."""
+    cache_path = _plan_cache_path(plan_body) if use_cache else None
+    if cache_path is not None and cache_path.exists():
+        log.info("Using cached plan from %s", cache_path)
+        plan_result = orjson.loads(cache_path.read_bytes())
+    else:
+        plan_task_id = await create_plan(client, plan_body)
+        log.info("Plan task created with ID: %s", plan_task_id)
+        log.info("Waiting for plan to be generated...")
+
+        plan_result = (await wait_plan(client, plan_task_id))["plan"]
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(orjson.dumps(plan_result))
+
+    # Print the plan
+    lines = [
+        "\nPlan generated successfully:",
+        f"Title: {plan_result['title']}",
+        f"Description: {plan_result['description']}",
+        "\nSteps:",
+    ]
+    lines.extend(
+        f"- {step['title']}: {step['description']}" for step in plan_result["steps"]
+    )
+    log.info("\n".join(lines))
+
+    # Execute the plan
+    log.info("\nExecuting the plan...")
+    execute_task_id = await create_execution(client, plan_result)
+    log.info("Execution task created with ID: %s", execute_task_id)
+    log.info("Waiting for execution to complete...")
+
+    # Print the steps as they complete, or all at once if they cannot be streamed
+    summary = await stream_execution(client, execute_task_id)
+    if summary is not None:
+        log.info(
+            "\nExecution completed successfully: %s of %s steps",
+            summary["steps_completed"],
+            summary["total_steps"],
         )
+        return summary
 
-        print("\nStep results:")
-        for step_result in execution_result["step_results"]:
-            print(f"\n- Step: {step_result['title']}")
-            print(f"  Status: {step_result['status']}")
-            print(
-                f"  Output: {step_result['output'][:100]}..."
-                if len(step_result["output"]) > 100
-                else f"  Output: {step_result['output']}"
-            )
+    execution_result = await wait_execution(client, execute_task_id)
+    print_execution(execution_result)
+    return execution_result
+
+
+async def run_pipeline(
+    client: httpx.AsyncClient, plan_bodies: list[bytes], use_cache: bool = True
+) -> list[dict | None]:
+    """Run the plan and execute flows for several encoded requests concurrently."""
+    return await asyncio.gather(
+        *(flow(client, body, use_cache=use_cache) for body in plan_bodies)
+    )
+
+
+def print_execution(execution_result: dict):
+    """Print the results of an executed plan."""
+    lines = [
+        "\nExecution completed successfully:",
+        f"Steps completed: {execution_result['steps_completed']} of {execution_result['total_steps']}",
+        "\nStep results:",
+    ]
+    for step_result in execution_result["step_results"]:
+        lines.extend(step_lines(step_result))
+    log.info("\n".join(lines))
+
+
+def step_lines(step_result: dict) -> list[str]:
+    """Format the result of one executed step."""
+    full_output = step_result.get("output") or ""
+    output = full_output[:OUTPUT_PREVIEW]
+    # Servers that trim the output report its full length
+    output_length = step_result.get("output_length", len(full_output))
+    suffix = "..." if output_length > len(output) else ""
+    return [
+        f"\n- Step: {step_result['title']}",
+        f"  Status: {step_result['status']}",
+        f"  Output: {output}{suffix}",
+    ]
+
+
+async def main(use_cache: bool = True, backend: str = "httpx"):
+    """Run the test."""
+    client = get_client(backend)
+    try:
+        log.info("Creating a plan...")
+        await run_pipeline(client, PLAN_REQUEST_BODIES, use_cache=use_cache)
+    except httpx.TimeoutException as e:
+        log.error("Request to the API server timed out: %r", e)
+    except TimeoutError:
+        log.error("A task did not finish within %.0f seconds", TASK_TIMEOUT)
+    finally:
+        await client.aclose()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"always generate a new plan instead of reusing one from {PLAN_CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("httpx", "aiohttp"),
+        default="httpx",
+        help="HTTP client library to call the API with (default: httpx)",
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        "-q", "--quiet", action="store_true", help="only report failures"
+    )
+    verbosity.add_argument(
+        "-v", "--verbose", action="store_true", help="also report each status poll"
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    level = logging.INFO
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    # Log to stdout with no prefixes, so the output reads as plain text. Only the
+    # script's own logger follows -v, the HTTP libraries stay at warnings.
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stdout)
+    log.setLevel(level)
+    loop_factory = uvloop.new_event_loop if uvloop is not None else None
+    asyncio.run(
+        main(use_cache=not args.no_cache, backend=args.backend),
+        loop_factory=loop_factory,
+    )
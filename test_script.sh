@@ -28,8 +28,8 @@ echo $TASK_RESPONSE | jq
 TASK_ID=$(echo $TASK_RESPONSE | jq -r '.task_id')
 AGENT_NAME=$(echo $TASK_RESPONSE | jq -r '.agent_name')
 
-# Check status immediately (should be "running")
-echo -e "\n3. Checking task status immediately (should be running):"
+# Check status immediately (may already be "completed")
+echo -e "\n3. Checking task status immediately (may already be completed):"
 curl -s $BASE_URL/agents/tasks/$AGENT_NAME/$TASK_ID | jq
 
 # Poll status until completed